@@ -1,30 +1,105 @@
+import io
 import os
 import json
 import time
 import hashlib
 import argparse
+import functools
+import itertools
+import logging
+import logging.handlers
+import queue
+import asyncio
+from datetime import datetime, timezone
 from pathlib import Path
 from tqdm import tqdm
-from google import genai
 from google.genai import types
 from dotenv import load_dotenv
+from gemini_client import get_client
 
 # 環境変数の読み込み
 load_dotenv()
 
+# orjsonがあれば使用（stdlib jsonより数倍高速）。なければstdlibにフォールバック
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
+# 同時にアップロードする最大件数（asyncioタスクなのでスレッドより軽い）
+MAX_CONCURRENT_UPLOADS = 16
+
+# この件数アップロードが成功するごとにマッピングを途中保存する
+CHECKPOINT_INTERVAL = 50
+
+logger = logging.getLogger(__name__)
+
+
+class _TqdmHandler(logging.Handler):
+    """tqdmのプログレスバーを壊さずにログを出力するハンドラ"""
+
+    def emit(self, record):
+        try:
+            tqdm.write(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+def _setup_logging(verbose=False):
+    """ログ出力をキュー経由で1スレッドに集約
+
+    アップロードタスクはキューに積むだけで即座に戻るため、tqdmのロックや
+    stderrのflushでイベントループが詰まらない。進行ログはdebugレベルに
+    落とし、--verbose指定時のみ表示する。
+
+    Args:
+        verbose: 進行ログも出力するか
+
+    Returns:
+        停止用のQueueListener
+    """
+    log_q = queue.SimpleQueue()
+    handler = _TqdmHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(log_q, handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_q))
+    logger.setLevel(logging.DEBUG if verbose else logging.INFO)
+    listener.start()
+    return listener
+
+
+def _dump_json(path, obj):
+    """辞書をJSONファイルにアトミックに書き出し（orjsonがあれば使用）
+
+    一時ファイルに書いてからos.replaceで差し替えるため、書き込み途中で
+    プロセスが落ちても既存ファイルは壊れない。
+
+    Args:
+        path: 書き出し先のパス
+        obj: 書き出す辞書
+    """
+    if orjson is not None:
+        data = orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    else:
+        data = json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+    tmp_path = f"{path}.tmp"
+    Path(tmp_path).write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+@functools.lru_cache(maxsize=None)
 def safe_filename(original_filename):
     """日本語ファイル名を安全なASCII名に変換
-    
+
     Args:
         original_filename: 元のファイル名
-        
+
     Returns:
         安全なASCII名のファイル名
     """
     name, ext = os.path.splitext(original_filename)
-    # ファイル名のハッシュ値を使用
-    hash_name = hashlib.md5(name.encode('utf-8')).hexdigest()[:16]
+    # ファイル名のハッシュ値を使用（digest_size=8でちょうど16桁のhexになる）
+    hash_name = hashlib.blake2b(name.encode('utf-8'), digest_size=8).hexdigest()
     return f"wiki_{hash_name}{ext}"
 
 
@@ -37,21 +112,31 @@ def load_file_mappings(mapping_file='file_mappings.json'):
     Returns:
         マッピング辞書
     """
-    if os.path.exists(mapping_file):
-        with open(mapping_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    # exists+openの2回のsyscall（かつTOCTOUレース）を避け、openに一本化する
+    try:
+        with open(mapping_file, 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return {}
+    return orjson.loads(raw) if orjson is not None else json.loads(raw)
 
 
 def save_file_mappings(mappings, mapping_file='file_mappings.json'):
     """ファイルマッピングを保存
     
+    件数だけを知りたい読み手（統計表示など）がJSON全体をパースしなくて
+    済むよう、件数をサイドカーファイル（<mapping_file>.count）にも書き出す。
+
     Args:
         mappings: マッピング辞書
         mapping_file: マッピングファイルのパス
     """
-    with open(mapping_file, 'w', encoding='utf-8') as f:
-        json.dump(mappings, f, ensure_ascii=False, indent=2)
+    _dump_json(mapping_file, mappings)
+
+    count_file = f"{mapping_file}.count"
+    tmp_path = f"{count_file}.tmp"
+    Path(tmp_path).write_text(str(len(mappings)), encoding='utf-8')
+    os.replace(tmp_path, count_file)
 
 
 def get_or_create_store(client, store_name=None):
@@ -100,10 +185,16 @@ def delete_store_files(client, store_name, mapping_file='file_mappings.json'):
     try:
         print("ファイルマッピング情報をクリア中...")
         
-        # マッピング情報をクリア
-        if os.path.exists(mapping_file):
-            os.remove(mapping_file)
+        # マッピング情報をクリア（件数サイドカーも一緒に消す）
+        try:
+            os.unlink(mapping_file)
             print(f"{mapping_file}を削除しました")
+        except FileNotFoundError:
+            pass
+        try:
+            os.unlink(f"{mapping_file}.count")
+        except FileNotFoundError:
+            pass
         
         print("\n⚠️ 注意: Store内のファイルは削除されていません")
         print("完全にリセットする場合は、以下の手順を実行してください:")
@@ -115,16 +206,109 @@ def delete_store_files(client, store_name, mapping_file='file_mappings.json'):
         print(f"リセット中にエラー: {e}")
 
 
-def upload_wikipedia_data(data_dir, reset=False, mapping_file='file_mappings.json'):
+def _iter_md(data_path):
+    """ディレクトリ直下のmarkdownファイルを列挙
+
+    Path.globのfnmatch処理を避け、os.scandirで直接走査する。
+    ファイル数が多いディレクトリで効く。
+
+    Args:
+        data_path: 走査するディレクトリのパス
+
+    Yields:
+        markdownファイルのPath
+    """
+    with os.scandir(data_path) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.endswith('.md'):
+                yield Path(entry.path)
+
+
+async def _wait_operation_async(client, operation, timeout=120):
+    """アップロードoperationの完了を非同期で待機
+
+    指数バックオフ（0.25秒から最大5秒）でポーリングする。待機中は
+    イベントループを明け渡すため、他のアップロードが進む。
+
+    Args:
+        client: Gemini APIクライアント
+        operation: 待機するoperation
+        timeout: タイムアウト秒数
+
+    Returns:
+        完了したoperation
+    """
+    start_time = time.time()
+    delay = 0.25
+    while not operation.done:
+        if time.time() - start_time > timeout:
+            raise TimeoutError("アップロードがタイムアウトしました")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 5.0)
+        operation = await client.aio.operations.get(operation)
+    return operation
+
+
+async def _upload_one(file_path, store_name, client, semaphore):
+    """1ファイルをFile Search Storeにアップロード
+
+    Args:
+        file_path: アップロードするmarkdownファイルのパス
+        store_name: アップロード先のStore名
+        client: Gemini APIクライアント
+        semaphore: 同時アップロード数を制限するSemaphore
+
+    Returns:
+        (ascii_name, マッピング情報の辞書) のタプル
+    """
+    async with semaphore:
+        original_name = file_path.name
+        ascii_name = safe_filename(original_name)
+
+        logger.debug(f"アップロード中: {original_name} -> {ascii_name}")
+
+        # ASCII名はメタデータとしてのみ必要なため、ディスクへの一時コピーは作らず
+        # メモリ上のバッファにASCII名を付けてそのままアップロードする
+        data = file_path.read_bytes()
+        buf = io.BytesIO(data)
+        buf.name = ascii_name
+
+        # ファイルをアップロード
+        operation = await client.aio.file_search_stores.upload_to_file_search_store(
+            file_search_store_name=store_name,
+            file=buf,
+            config={
+                'display_name': file_path.stem,
+                'mime_type': 'text/markdown',
+            }
+        )
+
+        # 完了待機（タイムアウト: 120秒）
+        operation = await _wait_operation_async(client, operation)
+
+        # マッピング情報を返す
+        return ascii_name, {
+            'original_filename': original_name,
+            'title': file_path.stem,
+            'upload_date': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S'),
+            'operation_name': operation.name if hasattr(operation, 'name') else 'N/A',
+            'file_size': len(data)
+        }
+
+
+def upload_wikipedia_data(data_dir, reset=False, mapping_file='file_mappings.json',
+                          force=False, verbose=False):
     """WikipediaデータをFile Search Storeにアップロード
-    
+
     Args:
         data_dir: データディレクトリ
         reset: 既存データをリセットするか
         mapping_file: マッピングファイルのパス
+        force: アップロード済みのファイルも再アップロードするか
+        verbose: ファイルごとの進行ログを表示するか
     """
-    # クライアントの作成
-    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    # 共有クライアントの取得
+    client = get_client()
     store_name = os.getenv("STORE_NAME")
     
     # Storeの取得または作成
@@ -144,81 +328,81 @@ def upload_wikipedia_data(data_dir, reset=False, mapping_file='file_mappings.jso
         return
     
     # markdownファイルの読み込み
-    md_files = list(data_path.glob("*.md"))
+    md_files = list(_iter_md(data_path))
     
     if not md_files:
         print(f"{data_dir} にmarkdownファイルが見つかりません")
         return
     
-    print(f"{len(md_files)}件のファイルをアップロードします...\n")
-    
     # ファイルマッピングの読み込み
     mappings = load_file_mappings(mapping_file)
-    
-    # 各ファイルの処理
+
+    # アップロード済みのファイルをスキップ（サイズが変わったものは再アップロード）
+    if not force and mappings:
+        pending = []
+        for file_path in md_files:
+            info = mappings.get(safe_filename(file_path.name))
+            if info and info.get('file_size') == file_path.stat().st_size:
+                print(f"スキップ（アップロード済み）: {file_path.name}")
+            else:
+                pending.append(file_path)
+        skipped = len(md_files) - len(pending)
+        if skipped:
+            print(f"{skipped}件はアップロード済みのためスキップします")
+        md_files = pending
+
+    if not md_files:
+        print("アップロードが必要なファイルはありません")
+        return
+
+    print(f"{len(md_files)}件のファイルをアップロードします...\n")
+
+    # 各ファイルを並列にアップロード（ネットワーク待ちを重ねて短縮）
     success_count = 0
     error_count = 0
-    
-    for file_path in tqdm(md_files, desc="データアップロード中"):
-        try:
-            original_name = file_path.name
-            ascii_name = safe_filename(original_name)
-            
-            # 一時ファイルとして保存（ASCII名）
-            temp_path = file_path.parent / ascii_name
-            
-            # ファイルをコピー（ASCII名で）
-            import shutil
-            shutil.copy2(file_path, temp_path)
-            
+    listener = _setup_logging(verbose)
+
+    async def _run_uploads():
+        nonlocal success_count, error_count
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+        async def _guarded(file_path):
+            # as_completed側で例外処理できるよう (パス, 結果, エラー) で返す
             try:
-                tqdm.write(f"アップロード中: {original_name} -> {ascii_name}")
-                
-                # ファイルをアップロード
-                operation = client.file_search_stores.upload_to_file_search_store(
-                    file_search_store_name=store.name,
-                    file=str(temp_path),
-                    config={
-                        'display_name': file_path.stem,
-                    }
-                )
-                
-                # 完了待機（公式推奨: 5秒間隔、タイムアウト: 120秒）
-                timeout = 120
-                start_time = time.time()
-                while not operation.done:
-                    if time.time() - start_time > timeout:
-                        raise TimeoutError("アップロードがタイムアウトしました")
-                    time.sleep(5)  # 公式推奨の待機時間
-                    operation = client.operations.get(operation)
-                
-                # アップロード成功
-                tqdm.write(f"  ✓ アップロード完了: {original_name}")
-                
-                # マッピング情報を保存
-                mappings[ascii_name] = {
-                    'original_filename': original_name,
-                    'title': file_path.stem,
-                    'upload_date': time.strftime('%Y-%m-%dT%H:%M:%S'),
-                    'operation_name': operation.name if hasattr(operation, 'name') else 'N/A',
-                    'file_size': file_path.stat().st_size
-                }
-                
-                success_count += 1
-                
-            except Exception as upload_error:
-                error_count += 1
-                tqdm.write(f"  ✗ アップロードエラー ({original_name}): {upload_error}")
-                
-            finally:
-                # 一時ファイルを削除
-                if temp_path.exists():
-                    temp_path.unlink()
-            
-        except Exception as e:
-            error_count += 1
-            tqdm.write(f"\n処理エラー ({file_path.name}): {e}")
-    
+                return file_path, await _upload_one(
+                    file_path, store.name, client, semaphore), None
+            except Exception as e:
+                return file_path, None, e
+
+        with tqdm(total=len(md_files), desc="データアップロード中") as progress:
+            for future in asyncio.as_completed([_guarded(p) for p in md_files]):
+                file_path, result, upload_error = await future
+
+                if upload_error is None:
+                    ascii_name, info = result
+
+                    # アップロード成功
+                    logger.debug(f"  ✓ アップロード完了: {file_path.name}")
+
+                    # マッピング情報を保存
+                    mappings[ascii_name] = info
+                    success_count += 1
+
+                    # 長時間の実行が途中で落ちても被害を限定するため、
+                    # 一定件数ごとにマッピングを途中保存する
+                    if success_count % CHECKPOINT_INTERVAL == 0:
+                        save_file_mappings(mappings, mapping_file)
+                else:
+                    error_count += 1
+                    logger.error(f"  ✗ アップロードエラー ({file_path.name}): {upload_error}")
+
+                progress.update(1)
+
+    try:
+        asyncio.run(_run_uploads())
+    finally:
+        listener.stop()
+
     # マッピング情報の保存
     save_file_mappings(mappings, mapping_file)
     
@@ -232,7 +416,7 @@ def upload_wikipedia_data(data_dir, reset=False, mapping_file='file_mappings.jso
     
     if len(mappings) > 0:
         print("\nアップロード済みファイル:")
-        for i, (ascii_name, info) in enumerate(list(mappings.items())[:5], 1):
+        for i, (ascii_name, info) in enumerate(itertools.islice(mappings.items(), 5), 1):
             original = info.get('original_filename', 'N/A')
             title = info.get('title', 'N/A')
             print(f"  {i}. {title} ({original})")
@@ -259,11 +443,21 @@ def main():
         action='store_true',
         help='既存のデータをリセットしてからアップロード'
     )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='アップロード済みのファイルも再アップロード'
+    )
     parser.add_argument(
         '--mapping-file',
         default='file_mappings.json',
         help='ファイルマッピングの保存先 (デフォルト: file_mappings.json)'
     )
+    parser.add_argument(
+        '--verbose',
+        action='store_true',
+        help='ファイルごとの進行ログを表示'
+    )
     
     args = parser.parse_args()
     
@@ -271,7 +465,8 @@ def main():
     print(f"データディレクトリ: {args.data_dir}\n")
     
     # データのアップロード
-    upload_wikipedia_data(args.data_dir, args.reset, args.mapping_file)
+    upload_wikipedia_data(args.data_dir, args.reset, args.mapping_file, args.force,
+                          args.verbose)
 
 
 if __name__ == "__main__":
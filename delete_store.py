@@ -6,8 +6,8 @@ File Search Store完全削除ユーティリティ
 """
 
 import os
-from google import genai
 from dotenv import load_dotenv
+from gemini_client import get_client
 
 # 環境変数の読み込み
 load_dotenv()
@@ -16,8 +16,8 @@ load_dotenv()
 def delete_store_completely():
     """File Search Storeを完全に削除"""
     
-    # クライアントの作成
-    client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+    # 共有クライアントの取得
+    client = get_client()
     store_name = os.getenv("STORE_NAME")
     
     if not store_name:
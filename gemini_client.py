@@ -0,0 +1,24 @@
+"""Gemini APIクライアントの共有モジュール
+
+スクリプトごとにgenai.Clientを作り直すと、TLSハンドシェイクと
+HTTPコネクションプールが毎回やり直しになる。プロセス内で1つの
+クライアントを作って使い回すことで、接続を温かいまま保つ。
+"""
+
+import os
+import functools
+from google import genai
+from dotenv import load_dotenv
+
+# 環境変数の読み込み
+load_dotenv()
+
+
+@functools.lru_cache(maxsize=1)
+def get_client():
+    """共有のGemini APIクライアントを取得
+
+    Returns:
+        genai.Client（プロセス内で同じインスタンスを返す）
+    """
+    return genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
@@ -1,23 +1,58 @@
 import os
-from google import genai
+import json
 from google.genai import types
 from dotenv import load_dotenv
+from gemini_client import get_client
+
+# orjsonがあれば使用（stdlib jsonより数倍高速）。なければstdlibにフォールバック
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # 環境変数の読み込み
 load_dotenv()
 
+# grounding_chunkから引用を取り出す属性パス（先に見つかったものを採用）
+_CITATION_RULES = (
+    'retrieved_context.title',
+    'retrieved_context.uri',
+    'web.uri',
+    'web.title',
+)
+
+
+def _walk(obj, path):
+    """ドット区切りの属性パスをたどる
+
+    Args:
+        obj: 起点のオブジェクト
+        path: 'retrieved_context.title' のようなドット区切りパス
+
+    Returns:
+        パスの先の値（途中の属性が欠けていればNone）
+    """
+    for name in path.split('.'):
+        obj = getattr(obj, name, None)
+        if obj is None:
+            return None
+    return obj
+
 
 class WikipediaRAGFileSearch:
     """File Searchを使用したWikipedia RAGシステム"""
-    
+
+    # list_files_in_store用のキャッシュ {パス: (mtime_ns, ファイル情報リスト)}
+    _mapping_cache = {}
+
     def __init__(self, store_name=None):
         """RAGシステムの初期化
         
         Args:
             store_name: 既存のFile Search Store名（省略時は環境変数から取得）
         """
-        # Gemini APIの設定
-        self.client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        # Gemini APIの設定（プロセス内で共有のクライアントを使用）
+        self.client = get_client()
         self.model_name = os.getenv("GEMINI_MODEL", "models/gemini-2.5-pro")
         
         # Store名の取得（引数 > 環境変数）
@@ -26,6 +61,14 @@ class WikipediaRAGFileSearch:
         if not self.store_name:
             print("警告: STORE_NAMEが設定されていません。")
             print("data_loader_filesearch.pyでStoreを作成してください。")
+            self._file_search_tool = None
+        else:
+            # Toolオブジェクトは質問ごとに変わらないため一度だけ構築して使い回す
+            self._file_search_tool = types.Tool(
+                file_search=types.FileSearch(
+                    file_search_store_names=[self.store_name]
+                )
+            )
     
     def generate_answer(self, query, temperature=0.7, debug=False):
         """質問に対する回答を生成
@@ -47,13 +90,7 @@ class WikipediaRAGFileSearch:
                 model=self.model_name,
                 contents=query,
                 config=types.GenerateContentConfig(
-                    tools=[
-                        types.Tool(
-                            file_search=types.FileSearch(
-                                file_search_store_names=[self.store_name]
-                            )
-                        )
-                    ],
+                    tools=[self._file_search_tool],
                     temperature=temperature
                 )
             )
@@ -117,55 +154,49 @@ class WikipediaRAGFileSearch:
             引用情報のリスト
         """
         citations = []
-        
+        seen = set()
+
+        def _add(value):
+            """重複を除いて引用を追加。上限（5件）に達したらTrueを返す"""
+            if value and value not in seen:
+                seen.add(value)
+                citations.append(value)
+            return len(citations) >= 5
+
         try:
-            if not hasattr(response, 'candidates') or not response.candidates:
+            candidates = getattr(response, 'candidates', None)
+            if not candidates:
                 return citations
-            
-            candidate = response.candidates[0]
-            
+
             # grounding_metadataから引用を取得
-            if hasattr(candidate, 'grounding_metadata'):
-                grounding = candidate.grounding_metadata
-                
+            # hasattrの連鎖の代わりに、属性パスの表をgetattrでたどる
+            # 5件集まった時点で残りのチャンクは見ずに打ち切る
+            grounding = getattr(candidates[0], 'grounding_metadata', None)
+            if grounding is not None:
                 # grounding_chunksから引用を抽出
-                if hasattr(grounding, 'grounding_chunks') and grounding.grounding_chunks:
-                    for chunk in grounding.grounding_chunks:
-                        # retrieved_contextから情報を取得
-                        if hasattr(chunk, 'retrieved_context'):
-                            context = chunk.retrieved_context
-                            if hasattr(context, 'title'):
-                                citations.append(context.title)
-                            elif hasattr(context, 'uri'):
-                                citations.append(context.uri)
-                        # webから情報を取得（Web検索の場合）
-                        elif hasattr(chunk, 'web') and chunk.web:
-                            if hasattr(chunk.web, 'uri'):
-                                citations.append(chunk.web.uri)
-                            elif hasattr(chunk.web, 'title'):
-                                citations.append(chunk.web.title)
-                
+                for chunk in getattr(grounding, 'grounding_chunks', None) or ():
+                    for path in _CITATION_RULES:
+                        value = _walk(chunk, path)
+                        if value:
+                            if _add(value):
+                                return citations
+                            break
+
                 # grounding_supportsから引用を抽出（別の構造の場合）
-                if hasattr(grounding, 'grounding_supports') and grounding.grounding_supports:
-                    for support in grounding.grounding_supports:
-                        if hasattr(support, 'segment'):
-                            segment = support.segment
-                            if hasattr(segment, 'text'):
-                                citations.append(f"引用: {segment.text[:100]}...")
-                
+                for support in getattr(grounding, 'grounding_supports', None) or ():
+                    text = _walk(support, 'segment.text')
+                    if text and _add(f"引用: {text[:100]}..."):
+                        return citations
+
                 # retrieval_metadataから引用を抽出
-                if hasattr(grounding, 'retrieval_metadata') and grounding.retrieval_metadata:
-                    metadata = grounding.retrieval_metadata
-                    if hasattr(metadata, 'sources'):
-                        for source in metadata.sources:
-                            if hasattr(source, 'title'):
-                                citations.append(source.title)
-        
+                for source in _walk(grounding, 'retrieval_metadata.sources') or ():
+                    if _add(getattr(source, 'title', None)):
+                        return citations
+
         except Exception as e:
             print(f"引用情報の抽出中にエラー: {e}")
-        
-        # 重複を削除
-        return list(dict.fromkeys(citations))[:5]  # 最大5件
+
+        return citations  # 最大5件（_addで重複排除済み）
     
     def get_store_info(self):
         """Store情報の取得
@@ -187,9 +218,12 @@ class WikipediaRAGFileSearch:
             'status': 'active'
         }
     
-    def list_files_in_store(self):
+    def list_files_in_store(self, limit=None):
         """Store内のファイル一覧を取得（マッピング情報から）
-        
+
+        Args:
+            limit: 返す最大件数（Noneの場合は全件）
+
         Returns:
             ファイル情報のリスト
         """
@@ -198,31 +232,53 @@ class WikipediaRAGFileSearch:
         
         try:
             # file_mappings.jsonから情報を取得
-            import json
             mapping_file = 'file_mappings.json'
-            if os.path.exists(mapping_file):
-                with open(mapping_file, 'r', encoding='utf-8') as f:
-                    mappings = json.load(f)
-                
-                file_list = []
-                for ascii_name, info in mappings.items():
-                    file_list.append({
-                        'name': ascii_name,
-                        'display_name': info.get('title', 'N/A'),
-                        'original_filename': info.get('original_filename', 'N/A'),
-                        'size_bytes': info.get('file_size', 0),
-                        'upload_date': info.get('upload_date', None)
-                    })
-                
-                return file_list
-            else:
+            try:
+                mtime = os.stat(mapping_file).st_mtime_ns
+            except FileNotFoundError:
                 print("file_mappings.jsonが見つかりません")
                 return []
-            
+
+            # ファイルが更新されていなければパース済みの結果を使い回す
+            cached = self._mapping_cache.get(mapping_file)
+            if cached is not None and cached[0] == mtime:
+                return cached[1][:limit] if limit is not None else cached[1]
+
+            with open(mapping_file, 'rb') as f:
+                raw = f.read()
+            mappings = orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+            file_list = []
+            for ascii_name, info in mappings.items():
+                file_list.append({
+                    'name': ascii_name,
+                    'display_name': info.get('title', 'N/A'),
+                    'original_filename': info.get('original_filename', 'N/A'),
+                    'size_bytes': info.get('file_size', 0),
+                    'upload_date': info.get('upload_date', None)
+                })
+
+            self._mapping_cache[mapping_file] = (mtime, file_list)
+            return file_list[:limit] if limit is not None else file_list
+
         except Exception as e:
             print(f"ファイル一覧の取得中にエラー: {e}")
             return []
 
+    def count_and_head_files_in_store(self, limit):
+        """Store内の総ファイル数と先頭limit件のファイル情報を取得
+
+        一覧の先頭数件しか表示しない画面向けに、総数と先頭分だけを返す。
+
+        Args:
+            limit: 先頭から返す件数
+
+        Returns:
+            (総ファイル数, ファイル情報のリスト) のタプル
+        """
+        files = self.list_files_in_store()
+        return len(files), files[:limit]
+
 
 # 使用例
 if __name__ == "__main__":
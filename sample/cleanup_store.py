@@ -14,9 +14,47 @@ File Search Store削除ツール
 import os
 import sys
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from google import genai
 
+# 削除の並列数と、APIレート上限に合わせた削除件数/秒
+MAX_DELETE_WORKERS = 8
+DELETE_RATE_PER_SEC = 10
+
+
+class _RateLimiter:
+    """トークンバケット方式のレートリミッタ
+
+    固定スリープの代わりに、毎秒rate個のトークンが補充されるバケットから
+    acquire()で1つ取り出す。バケットが空のときだけ待つため、クォータの
+    範囲内で並列リクエストを最大限詰め込める。
+    """
+
+    def __init__(self, rate):
+        self._rate = rate
+        self._tokens = float(rate)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取得（補充されるまでブロック）"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    float(self._rate),
+                    self._tokens + (now - self._last) * self._rate
+                )
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                wait = (1.0 - self._tokens) / self._rate
+            time.sleep(wait)
+
+
 def list_stores(client):
     """利用可能なStoreのリストを取得して表示"""
     
@@ -114,27 +152,38 @@ def delete_store_with_documents(client, store_name):
             print(f"  → Storeが既に存在しないか、空の可能性があります")
             documents = []
         
-        # Step 2: 各ドキュメントを削除（config={'force': True}で関連Chunksも削除）
+        # Step 2: 各ドキュメントを並列削除（config={'force': True}で関連Chunksも削除）
+        # 1件ごとの固定スリープの代わりに、レートリミッタでAPI制限を守りながら
+        # 複数の削除リクエストを同時に飛ばす
         if documents:
             print(f"\nStep 2: {doc_count}個のドキュメント（および関連データ）を削除中...")
-            for i, doc in enumerate(documents, 1):
-                try:
-                    print(f"  [{i}/{doc_count}] 削除中: {doc.name}")
-                    # config={'force': True}を指定してChunksも一緒に削除
-                    client.file_search_stores.documents.delete(
-                        name=doc.name,
-                        config={'force': True}
-                    )
-                    print(f"  ✅ 削除完了（関連データを含む）")
-                except Exception as e:
-                    print(f"  ⚠️  削除失敗: {e}")
-                    # エラーがあっても続行
-                
-                # API制限を避けるため少し待機
-                if i < doc_count:
-                    time.sleep(0.5)
-            
-            print(f"\n  → 全ドキュメントの削除処理が完了しました")
+            limiter = _RateLimiter(DELETE_RATE_PER_SEC)
+
+            def _delete_one(doc):
+                limiter.acquire()
+                # config={'force': True}を指定してChunksも一緒に削除
+                client.file_search_stores.documents.delete(
+                    name=doc.name,
+                    config={'force': True}
+                )
+
+            deleted = 0
+            failed = 0
+            with ThreadPoolExecutor(max_workers=MAX_DELETE_WORKERS) as executor:
+                futures = {executor.submit(_delete_one, doc): doc for doc in documents}
+                for i, future in enumerate(as_completed(futures), 1):
+                    doc = futures[future]
+                    try:
+                        future.result()
+                        deleted += 1
+                        print(f"  [{i}/{doc_count}] ✅ 削除完了: {doc.name}")
+                    except Exception as e:
+                        failed += 1
+                        print(f"  [{i}/{doc_count}] ⚠️  削除失敗 ({doc.name}): {e}")
+                        # エラーがあっても続行
+
+            print(f"\n  → 全ドキュメントの削除処理が完了しました"
+                  f"（成功: {deleted}件 / 失敗: {failed}件）")
         else:
             print("\nStep 2: スキップ（削除するドキュメントがありません）")
         
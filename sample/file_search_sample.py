@@ -46,11 +46,14 @@ if os.path.exists(file_path):
         file=file_path
     )
     
-    # 完了待機
-    while not operation.done:
-        print("Waiting for upload to complete...")
-        time.sleep(1)
-        operation = client.operations.get(operation)
+    # 完了待機（SDKのresult()があればサーバ側の完了通知を利用）
+    if hasattr(operation, 'result'):
+        operation = operation.result(timeout=120)
+    else:
+        while not operation.done:
+            print("Waiting for upload to complete...")
+            time.sleep(1)
+            operation = client.operations.get(operation)
     
     print("Upload completed successfully!")
 else:
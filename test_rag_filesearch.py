@@ -1,36 +1,176 @@
+import os
+import sys
 import json
-from rag_system_filesearch import WikipediaRAGFileSearch
+import time
+import functools
+import itertools
+import operator
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+# orjsonがあれば使用（stdlib jsonより数倍高速）。なければstdlibにフォールバック
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 画面表示用の区切り線とメニュー（ループのたびに組み立てないよう定数化）
+SEP = "=" * 60
+DASH = "-" * 60
+MENU_BANNER = (
+    "\n" + SEP + "\n"
+    "Wikipedia RAG File Search システム - テストメニュー\n"
+    + SEP + "\n"
+    "1. 質問応答テスト\n"
+    "2. インタラクティブモード（連続質問）\n"
+    "3. 統計情報の表示\n"
+    "4. ファイルマッピング一覧\n"
+    "5. 終了\n"
+    + SEP + "\n"
+)
+
+# 表示ループでよく使うフィールドをまとめて取り出すgetter
+# （.get(key, default)の連鎖より1回のC呼び出しで済む）
+_mapping_fields = operator.itemgetter('original_filename', 'title', 'upload_date')
+_file_fields = operator.itemgetter('display_name', 'original_filename', 'size_bytes')
+
+# store_infoキャッシュの有効期間（秒）
+_STORE_INFO_TTL = 30.0
+_store_info_cache = None  # (取得時刻, store_info)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_rag():
+    """共有のWikipediaRAGFileSearchインスタンスを取得
+
+    メニュー項目を選ぶたびにクライアントを作り直さないよう、
+    プロセス内で1つのインスタンスを使い回す。importをここまで遅延させる
+    ことで、SDK一式の読み込みを初回利用時まで持ち越し、メニュー表示までの
+    起動時間を短くしている。
+
+    Returns:
+        WikipediaRAGFileSearchインスタンス
+    """
+    from rag_system_filesearch import WikipediaRAGFileSearch
+    return WikipediaRAGFileSearch()
+
+
+def _get_store_info():
+    """Store情報を取得（一定時間キャッシュ）
+
+    Returns:
+        Store情報の辞書
+    """
+    global _store_info_cache
+    now = time.monotonic()
+    if _store_info_cache is None or now - _store_info_cache[0] > _STORE_INFO_TTL:
+        _store_info_cache = (now, _get_rag().get_store_info())
+    return _store_info_cache[1]
+
+
+# load_file_mappings用のキャッシュ ((パス, mtime_ns, サイズ), パース済み辞書)
+_mappings_cache = None
 
 
 def load_file_mappings(mapping_file='file_mappings.json'):
     """ファイルマッピングを読み込み
-    
+
+    ファイルのシグネチャ（mtime_nsとサイズ）が前回と同じなら、パース済みの
+    辞書をそのまま返す。show_statisticsとshow_file_mappingsが続けて呼ばれる
+    ようなケースでは、2回目以降はos.stat1回で済む。
+
     Args:
         mapping_file: マッピングファイルのパス
-        
+
     Returns:
         マッピング辞書
     """
+    global _mappings_cache
+    # 初回実行時などファイルが無いケースは珍しくないため、例外の組み立て
+    # （トレースバック生成）を避けて事前チェックで返す
+    if not os.path.isfile(mapping_file):
+        return {}
+
+    st = os.stat(mapping_file)
+    signature = (mapping_file, st.st_mtime_ns, st.st_size)
+    if _mappings_cache is not None and _mappings_cache[0] == signature:
+        return _mappings_cache[1]
+
+    with open(mapping_file, 'rb') as f:
+        raw = f.read()
+    mappings = orjson.loads(raw) if orjson is not None else json.loads(raw)
+
+    _mappings_cache = (signature, mappings)
+    return mappings
+
+
+def mapping_count(mapping_file='file_mappings.json'):
+    """マッピングの総数を取得
+
+    データローダーが書き出す件数サイドカー（<mapping_file>.count）が
+    あればそれを読むだけで済ませ、なければ全体を読み込んでlen()を取る。
+
+    Args:
+        mapping_file: マッピングファイルのパス
+
+    Returns:
+        マッピングの件数
+    """
     try:
-        with open(mapping_file, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(f"{mapping_file}.count", 'r', encoding='utf-8') as f:
+            return int(f.read())
+    except (FileNotFoundError, ValueError):
+        return len(load_file_mappings(mapping_file))
+
+
+def load_first_n_mappings(mapping_file='file_mappings.json', n=3):
+    """マッピングファイルの先頭n件だけを読み込み
+
+    ijsonがあればストリーミングパースし、n件そろった時点でファイルの残りを
+    読まずに打ち切る。なければ通常の読み込み（キャッシュあり）の先頭n件を
+    返す。
+
+    Args:
+        mapping_file: マッピングファイルのパス
+        n: 読み込む件数
+
+    Returns:
+        先頭n件のマッピング辞書
+    """
+    try:
+        import ijson
+    except ImportError:
+        return dict(itertools.islice(load_file_mappings(mapping_file).items(), n))
+
+    out = {}
+    try:
+        with open(mapping_file, 'rb') as f:
+            for key, value in ijson.kvitems(f, ''):
+                out[key] = value
+                if len(out) == n:
+                    break
     except FileNotFoundError:
-        return {}
+        pass
+    return out
 
 
 def test_qa():
     """質問応答のテスト"""
-    rag = WikipediaRAGFileSearch()
-    
+    rag = _get_rag()
+
+    # Store情報の取得は入力待ちの裏で進めておき、ネットワーク往復を
+    # ユーザーの入力時間に隠す
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        store_info_future = executor.submit(_get_store_info)
+        query = input("\n質問を入力: ").strip()
+        store_info = store_info_future.result()
+
     # Store情報の確認
-    store_info = rag.get_store_info()
     if store_info.get('status') != 'active':
         print("\nエラー: File Search Storeが設定されていません")
         print("data_loader_filesearch.pyでデータをアップロードしてください")
         return
-    
-    query = input("\n質問を入力: ").strip()
-    
+
     if not query:
         print("質問が入力されていません")
         return
@@ -41,187 +181,265 @@ def test_qa():
     print(f"\n回答を生成中...\n")
     answer = rag.generate_answer(query, debug=debug_mode)
     
-    print("=" * 60)
+    print(SEP)
     print("【回答】")
-    print("=" * 60)
+    print(SEP)
     print(answer)
-    print("=" * 60)
+    print(SEP)
+
+
+@dataclass
+class _SessionState:
+    """インタラクティブモードのセッション状態"""
+    debug: bool = False
+    done: bool = False
+
+
+def _cmd_quit(state):
+    print("終了します")
+    state.done = True
+
+
+def _cmd_debug_on(state):
+    state.debug = True
+    print("デバッグモードを有効にしました")
+
+
+def _cmd_debug_off(state):
+    state.debug = False
+    print("デバッグモードを無効にしました")
+
+
+# インタラクティブモードのコマンド表（文字列比較の連鎖を1回の辞書引きに）
+_COMMANDS = {
+    'quit': _cmd_quit,
+    'exit': _cmd_quit,
+    'q': _cmd_quit,
+    'debug on': _cmd_debug_on,
+    'debug off': _cmd_debug_off,
+}
+
+
+# インタラクティブモードの入力履歴の保存先
+_HISTORY_FILE = '.rag_history'
+
+
+def _setup_readline():
+    """readlineによる行編集・履歴・コマンドのTab補完を有効化
+
+    readlineが使えない環境（Windowsなど）では何もしない。
+
+    Returns:
+        履歴保存用の関数（readlineが無ければNone）
+    """
+    try:
+        import readline
+    except ImportError:
+        return None
+
+    def _complete(text, state):
+        matches = [c for c in _COMMANDS if c.startswith(text)]
+        return matches[state] if state < len(matches) else None
+
+    readline.set_completer(_complete)
+    readline.parse_and_bind('tab: complete')
+    try:
+        readline.read_history_file(_HISTORY_FILE)
+    except OSError:
+        pass
+
+    def _save_history():
+        try:
+            readline.write_history_file(_HISTORY_FILE)
+        except OSError:
+            pass
+
+    return _save_history
 
 
 def interactive_mode():
     """インタラクティブモード（連続質問）"""
-    rag = WikipediaRAGFileSearch()
-    
+    rag = _get_rag()
+
     # Store情報の確認
-    store_info = rag.get_store_info()
+    store_info = _get_store_info()
     if store_info.get('status') != 'active':
         print("\nエラー: File Search Storeが設定されていません")
         print("data_loader_filesearch.pyでデータをアップロードしてください")
         return
-    
+
     print("\nインタラクティブモードを開始します")
     print("終了するには 'quit' または 'exit' と入力してください")
     print("デバッグモードを有効にするには 'debug on' と入力してください")
-    print("=" * 60)
-    
-    debug_mode = False
-    
-    while True:
-        query = input("\n質問: ").strip()
-        
-        if query.lower() in ['quit', 'exit', 'q']:
-            print("終了します")
-            break
-        
-        if query.lower() == 'debug on':
-            debug_mode = True
-            print("デバッグモードを有効にしました")
-            continue
-        
-        if query.lower() == 'debug off':
-            debug_mode = False
-            print("デバッグモードを無効にしました")
-            continue
-        
-        if not query:
-            continue
-        
-        print("\n回答を生成中...\n")
-        answer = rag.generate_answer(query, debug=debug_mode)
-        
-        print("-" * 60)
-        print(answer)
-        print("-" * 60)
+    print(SEP)
+
+    state = _SessionState()
+    save_history = _setup_readline()
+
+    try:
+        while True:
+            query = input("\n質問: ").strip()
+
+            handler = _COMMANDS.get(query.lower())
+            if handler is not None:
+                handler(state)
+                if state.done:
+                    break
+                continue
+
+            if not query:
+                continue
+
+            print("\n回答を生成中...\n")
+            answer = rag.generate_answer(query, debug=state.debug)
+
+            print(DASH)
+            print(answer)
+            print(DASH)
+    finally:
+        if save_history is not None:
+            save_history()
 
 
 def show_statistics():
     """統計情報の表示"""
-    rag = WikipediaRAGFileSearch()
-    
-    print("\n" + "=" * 60)
-    print("統計情報")
-    print("=" * 60)
-    
+    rag = _get_rag()
+
+    # 1画面分をまとめて組み立て、最後に1回のwriteで出力する
+    buf = ["", SEP, "統計情報", SEP]
+
     # Store情報
-    store_info = rag.get_store_info()
-    print(f"\n【Store情報】")
-    print(f"  Store名: {store_info.get('store_name', 'N/A')}")
-    print(f"  表示名: {store_info.get('display_name', 'N/A')}")
-    print(f"  ステータス: {store_info.get('status', 'N/A')}")
-    
+    store_info = _get_store_info()
+    buf.append("\n【Store情報】")
+    buf.append(f"  Store名: {store_info.get('store_name', 'N/A')}")
+    buf.append(f"  表示名: {store_info.get('display_name', 'N/A')}")
+    buf.append(f"  ステータス: {store_info.get('status', 'N/A')}")
+
     if store_info.get('status') == 'active':
         # ファイル一覧（マッピング情報から）
-        print(f"\n【Store内のファイル】")
-        files = rag.list_files_in_store()
-        print(f"  総ファイル数: {len(files)}件")
-        
+        buf.append("\n【Store内のファイル】")
+        total, files = rag.count_and_head_files_in_store(5)
+        buf.append(f"  総ファイル数: {total}件")
+
         if files:
-            print(f"\n  最近のファイル（最大5件）:")
-            for i, file_info in enumerate(files[:5], 1):
-                display_name = file_info.get('display_name', 'N/A')
-                original = file_info.get('original_filename', 'N/A')
-                size_kb = file_info.get('size_bytes', 0) / 1024
-                print(f"    {i}. {display_name}")
-                print(f"       元ファイル: {original} ({size_kb:.1f}KB)")
-        
-        # マッピング情報
-        mappings = load_file_mappings()
-        if mappings:
-            print(f"\n【ファイルマッピング情報】")
-            print(f"  マッピング総数: {len(mappings)}件")
-            print(f"\n  マッピングサンプル（最大3件）:")
-            for i, (ascii_name, info) in enumerate(list(mappings.items())[:3], 1):
-                original = info.get('original_filename', 'N/A')
-                title = info.get('title', 'N/A')
-                upload_date = info.get('upload_date', 'N/A')
-                print(f"    {i}. {title}")
-                print(f"       元ファイル: {original}")
-                print(f"       アップロード日: {upload_date}")
+            buf.append("\n  最近のファイル（最大5件）:")
+            for i, file_info in enumerate(files, 1):
+                try:
+                    display_name, original, size_bytes = _file_fields(file_info)
+                except KeyError:
+                    display_name = file_info.get('display_name', 'N/A')
+                    original = file_info.get('original_filename', 'N/A')
+                    size_bytes = file_info.get('size_bytes', 0)
+                size_kb = size_bytes / 1024
+                buf.append(f"    {i}. {display_name}")
+                buf.append(f"       元ファイル: {original} ({size_kb:.1f}KB)")
+
+        # マッピング情報（サンプル表示には先頭3件だけ読み込めば足りる）
+        mapping_total = mapping_count()
+        if mapping_total:
+            buf.append("\n【ファイルマッピング情報】")
+            buf.append(f"  マッピング総数: {mapping_total}件")
+            buf.append("\n  マッピングサンプル（最大3件）:")
+            for i, (ascii_name, info) in enumerate(load_first_n_mappings(n=3).items(), 1):
+                try:
+                    original, title, upload_date = _mapping_fields(info)
+                except KeyError:
+                    original = info.get('original_filename', 'N/A')
+                    title = info.get('title', 'N/A')
+                    upload_date = info.get('upload_date', 'N/A')
+                buf.append(f"    {i}. {title}")
+                buf.append(f"       元ファイル: {original}")
+                buf.append(f"       アップロード日: {upload_date}")
     else:
-        print("\nStoreが設定されていないか、エラーが発生しています")
+        buf.append("\nStoreが設定されていないか、エラーが発生しています")
         if store_info.get('error'):
-            print(f"エラー詳細: {store_info.get('error')}")
-    
-    print("=" * 60)
+            buf.append(f"エラー詳細: {store_info.get('error')}")
+
+    buf.append(SEP)
+    sys.stdout.write("\n".join(buf) + "\n")
 
 
 def show_file_mappings():
     """ファイルマッピング一覧の表示"""
-    print("\n" + "=" * 60)
-    print("ファイルマッピング一覧")
-    print("=" * 60)
-    
+    # 1画面分をまとめて組み立て、最後に1回のwriteで出力する
+    buf = ["", SEP, "ファイルマッピング一覧", SEP]
+
     mappings = load_file_mappings()
-    
+
     if not mappings:
-        print("\nファイルマッピング情報が見つかりません")
-        print("data_loader_filesearch.pyでデータをアップロードしてください")
+        buf.append("\nファイルマッピング情報が見つかりません")
+        buf.append("data_loader_filesearch.pyでデータをアップロードしてください")
+        sys.stdout.write("\n".join(buf) + "\n")
         return
-    
-    print(f"\n総数: {len(mappings)}件\n")
-    
+
+    buf.append(f"\n総数: {len(mappings)}件\n")
+
     for i, (ascii_name, info) in enumerate(mappings.items(), 1):
-        original = info.get('original_filename', 'N/A')
-        title = info.get('title', 'N/A')
-        upload_date = info.get('upload_date', 'N/A')
-        
-        print(f"{i}. {title}")
-        print(f"   元ファイル名: {original}")
-        print(f"   ASCII名: {ascii_name}")
-        print(f"   アップロード日: {upload_date}")
-        print()
-    
-    print("=" * 60)
+        try:
+            original, title, upload_date = _mapping_fields(info)
+        except KeyError:
+            original = info.get('original_filename', 'N/A')
+            title = info.get('title', 'N/A')
+            upload_date = info.get('upload_date', 'N/A')
+
+        # 1エントリ＝1要素でまとめて組み立てる（末尾の改行が空行になる）
+        buf.append(
+            f"{i}. {title}\n"
+            f"   元ファイル名: {original}\n"
+            f"   ASCII名: {ascii_name}\n"
+            f"   アップロード日: {upload_date}\n"
+        )
+
+    buf.append(SEP)
+    sys.stdout.write("\n".join(buf) + "\n")
+
+
+# メインメニューの選択肢表（if/elifの連鎖を1回の辞書引きに）
+_MENU = {
+    '1': test_qa,
+    '2': interactive_mode,
+    '3': show_statistics,
+    '4': show_file_mappings,
+}
 
 
 def main():
     """メインメニュー"""
     while True:
-        print("\n" + "=" * 60)
-        print("Wikipedia RAG File Search システム - テストメニュー")
-        print("=" * 60)
-        print("1. 質問応答テスト")
-        print("2. インタラクティブモード（連続質問）")
-        print("3. 統計情報の表示")
-        print("4. ファイルマッピング一覧")
-        print("5. 終了")
-        print("=" * 60)
-        
+        # メニューは1回のwriteでまとめて出力する
+        sys.stdout.write(MENU_BANNER)
+
         choice = input("\n選択 (1-5): ").strip()
-        
-        if choice == '1':
-            test_qa()
-        elif choice == '2':
-            interactive_mode()
-        elif choice == '3':
-            show_statistics()
-        elif choice == '4':
-            show_file_mappings()
-        elif choice == '5':
+
+        if choice == '5':
             print("\n終了します")
             break
+
+        action = _MENU.get(choice)
+        if action is not None:
+            action()
         else:
             print("\n無効な選択です")
 
 
 if __name__ == "__main__":
-    # 初期確認
-    rag = WikipediaRAGFileSearch()
-    store_info = rag.get_store_info()
+    # 初期確認（ここで取得したstore_infoはキャッシュされ、
+    # メニューの各機能からもそのまま再利用される）
+    store_info = _get_store_info()
     
     if store_info.get('status') != 'active':
-        print("\n" + "=" * 60)
+        print("\n" + SEP)
         print("⚠️  注意")
-        print("=" * 60)
+        print(SEP)
         print("\nFile Search Storeが設定されていません")
         print("先にdata_loader_filesearch.pyを実行してください:")
         print("\n  $ python data_loader_filesearch.py")
-        print("\n" + "=" * 60)
+        print("\n" + SEP)
         
         proceed = input("\nそれでもテストメニューを起動しますか？ (y/N): ").strip()
         if proceed.lower() != 'y':
             print("終了します")
-            exit(0)
+            raise SystemExit(0)
     
     # メインメニューを起動
     main()
\ No newline at end of file